@@ -10,7 +10,7 @@
 #   - 0.01                                                                                                      #
 #       - New                                                                                                   #
 # Known Issues:                                                                                                 #
-#   - Polygons parsed to lines do not parse holes                                                               #
+#   - None                                                                                                      #
 # To Do:                                                                                                        #
 #   - Colour Listing for Jonas                                                                                  #
 #   - Export capable for GNG                                                                                    #
@@ -31,9 +31,13 @@
 #===============================================================================================================#
 
 from os import path, write, listdir, mkdir, getcwd, scandir
-from json import load,dumps
+from json import load,loads,dumps,JSONDecoder
+from fnmatch import fnmatchcase
+from sys import argv, stdin, stdout
+from socketserver import TCPServer, StreamRequestHandler
 from re import search
 from datetime import datetime
+from time import perf_counter
 import math
 
 # First, to facilitate parsing, create a dictionary that holds all entries, split into the different ES
@@ -43,6 +47,17 @@ import math
 
 AIRAC = "2206"
 
+# The export selection can be used to only export parts of the input, e.g. only the taxiway centrelines of one airport. Airports are ICAO codes, categories
+# are patterns matched against the cat attribute where * matches anything (e.g. "twy*"), and ES categories are "geo", "regions" or "freetext". An empty
+# list means no restriction. Features that aren't selected are skipped before their geometry is even decoded.
+
+exportSelection = {
+    "Airports":[],
+    "Categories":[],
+    "ES Categories":[]
+}
+selection = exportSelection
+
 esData = {
     "geo":{
         "Output String":"",
@@ -86,6 +101,23 @@ log = "Started Logging at " + datetime.now().strftime("%Y-%m-%d, %H:%M:%S") + "
 
 colorsUsed = []
 
+# All features read from the GeoJSON files are kept in here, so that several build configurations can share a single read of the input
+
+parsedFeatures = []
+
+# Freetext labels waiting for the label density check are parked in here until every file has been read
+
+labelData = []
+
+# Same thing for the regions waiting for the region dissolve
+
+regionData = []
+
+# The output profile collects the counts of everything emitted, per group, per category and per airport
+
+profileColumns = ["Features","Vertices","Segments","SCT Bytes","ESE Bytes","GNG Bytes","Time (ms)"]
+profileData = {}
+
 # I create two strings with the current date, this is important as it's used in the output file name and the .sct and .ese files need to have exactly the same name
 
 dateString = datetime.now().strftime("%Y-%m-%d")
@@ -97,7 +129,10 @@ defFilePath = path.dirname(__file__) + "\\Input\\Configuration\\ES Exporter Defi
 geoJSONFolderPath = path.dirname(__file__) + "\\Input\\GeoJSON\\"                                           # Input GeoJSON location
 sctHeaderPath = path.dirname(__file__) + "\\Input\\Configuration\\sct_File_Header.txt"                      # Input of the sct Header file used as a basis for building the export
 eseHeaderPath = path.dirname(__file__) + "\\Input\\Configuration\\ese_File_Header.txt"                      # Input of the ese Header file used as a basis for building the export
+configFolderPath = path.dirname(__file__) + "\\Input\\Configuration\\"                                      # Configuration folder, build configurations refer to files in here
 outputFolder = path.dirname(__file__) + "\\Output\\"                                                        # Output folder location
+buildFilePath = path.dirname(__file__) + "\\Input\\Configuration\\Build Configurations.json"                # Optional list of build configurations for batch builds
+outputPrefix = ""                                                                                           # Prefix for the output file names, set by the build configuration
 
 if globalDebugging:
     log += ("Folder paths:\n  Definitions File: " + defFilePath + "\n  geoJSON Folder: " + geoJSONFolderPath + "\n  .SCT  header File: " + sctHeaderPath + "\n  .ESE  header File: " + eseHeaderPath + "\n  Output Folder: " + outputFolder + "\n")
@@ -108,14 +143,16 @@ if not path.isdir(outputFolder):
     mkdir(outputFolder)
     log += "Creating output folder at " +  outputFolder + "\n"
 
-# Here we define a function to read the definitions file and then dump it into a global dict for easy access, and then run said function
+# Here we define a function to read the definitions file and then dump it into a global dict for easy access. It is run for every build configuration.
 
 def readDefinitions ():
     with open (defFilePath) as defFile:
         global definitions
         definitions = load(defFile)
 
-readDefinitions()
+# A single JSON decoder that is used to decode parts of a GeoJSON file at a time
+
+jsonDecoder = JSONDecoder()
 
 # This is a quick helper function to convert coordinates from QGIS (DDD.ddddd) to EuroScope (DDD.MM.SS.sss) Format and prefix the hemispheres
 
@@ -152,62 +189,117 @@ def decimalDegreesToESNotation(coordinatePair):
     
     return formattedNorth + " " + formattedEast
 
-# This is the function that does most of the heavy lifting, it takes a dictionary that contains all the necessary data read from the geoJSON input file and 
-# mapped to more applicable categories through the definitions file and converts it into a multi-line string in the correct format for EuroScope
-
-def formatFeatureForES (featureObject,featureType,debugging=False):
+# GeoJSON nests its coordinates differently for every geometry type, polygons are nested deeper than lines, which are nested deeper than points, and every
+# Multi* type adds another level on top. To not have to deal with that in every formatter, this function flattens any geometry into one long list of
+# vertices with two lists of offsets, the ring offsets tell where each ring (or line, or point) starts in the vertex list and the part offsets tell which
+# rings belong to which part. All vertices are converted to the EuroScope notation in one go, so the formatters only have to slice the result.
+
+def flattenGeometry(coordinates,featureType):
+    if featureType == "Point":
+        parts = [[[coordinates]]]
+    elif featureType == "MultiPoint":
+        parts = [[[point]] for point in coordinates]
+    elif featureType == "LineString":
+        parts = [[coordinates]]
+    elif featureType == "MultiLineString":
+        parts = [[line] for line in coordinates]
+    elif featureType == "Polygon":
+        parts = [coordinates]
+    elif featureType == "MultiPolygon":
+        parts = coordinates
+    else:
+        return None
+
+    vertices = []
+    ringOffsets = [0]
+    partOffsets = [0]
+    for part in parts:
+        for ring in part:
+            if len(ring) == 0:
+                continue
+            vertices.extend(ring)
+            ringOffsets.append(len(vertices))
+        partOffsets.append(len(ringOffsets) - 1)
+
+    return {
+        "Vertices":vertices,
+        "Ring Offsets":ringOffsets,
+        "Part Offsets":partOffsets,
+        "Formatted":[decimalDegreesToESNotation(vertex) for vertex in vertices]
+    }
 
-    global log
+# Both formatters need the same flattened geometry, so this function checks whether the geometry type of a feature fits the feature type it is mapped to
+# and flattens it. The result is kept in the feature object so the second formatter doesn't have to do it again. This function also deals with "downgrading"
+# features between feature types, i.e. mapping a polygon to a line feature, in that case all rings of all parts are drawn as lines.
 
-    # Initially we need to check which category of ES object we're writing to as the formatting conventions in EuroScope / VRC aren't exactly standardized
-    # First step is to format the color of the object for Euroscope, as at least this part is common to all object formats
+def featureGeometry(featureObject,featureType,debugging=False):
 
-    color = featureObject["Color"]
-    if not color.isdecimal():
-        color = "COLOR_" + color
+    global log
 
-    # Secondly we check what kind of a feature type we're dealing with and extracting the coordinate list accordingly, this is necessary due to a nesting 
-    # quirk of GeoJSON where polygons are nested deeper than lines, which are nested deeper than points. The check for holes in polygons has already been
-    # implemented, currently they're just assigned the color value of the backgrround as defined in definitions. This function also deals with "downgrading" 
-    # features between feature types, i.e. mapping a polygon to a line feature.
+    if "Flattened Geometry" in featureObject:
+        return featureObject["Flattened Geometry"]
 
     if debugging:
         log += ("Feature Type of working feature is: " + featureObject["Feature Type"] + "\n")
 
+    geometry = -1
     if len(featureObject["Coordinates"]) == 0:
         log += "Found an empty feature of group " + featureObject["Group"] + ", skipping." + "\n"
-        return -1
-    if featureObject["Feature Type"] == "Polygon":
-        if not featureType == "MultiPolygon":
+    elif featureObject["Feature Type"] == "Polygon":
+        if featureType in ["Polygon","MultiPolygon"]:
+            geometry = flattenGeometry(featureObject["Coordinates"],featureType)
+        else:
             log += "Tried mapping a feature of group " + featureObject["Group"] + " that isn't a polygon to a Euroscope region.\n"
-            return -1
-        coordinates = featureObject["Coordinates"][0]
     elif featureObject["Feature Type"] == "Line":
-        if not featureType == "MultiLineString":
-            if featureType == "MultiPolygon":
-                log += "Mapping a polygon feature of group " + featureObject["Group"] + " to a Euroscope geo line, holes may be lost in the process.\n"
-                coordinates = featureObject["Coordinates"][0]
-            elif featureType == "LineString":
-                coordinates = [featureObject["Coordinates"]]
-            else:
-                log += "Tried mapping a point feature or a feature of unknown type of group " + featureObject["Group"] + " to a Euroscope geo line.\n"
-                return -1
+        if featureType in ["LineString","MultiLineString"]:
+            geometry = flattenGeometry(featureObject["Coordinates"],featureType)
+        elif featureType in ["Polygon","MultiPolygon"]:
+            if debugging:
+                log += "Mapping a polygon feature of group " + featureObject["Group"] + " to a Euroscope geo line, all rings will be drawn as lines.\n"
+            geometry = flattenGeometry(featureObject["Coordinates"],featureType)
         else:
-            coordinates = featureObject["Coordinates"]         
+            log += "Tried mapping a point feature or a feature of unknown type of group " + featureObject["Group"] + " to a Euroscope geo line.\n"
     elif featureObject["Feature Type"] == "Point":
-        if not featureType == "Point":
-            if featureType == "MultiPolygon":
-                log += "Mapping a polygon feature of group " + featureObject["Group"] + " to a Euroscope freetext point, only the first coordinate will be considered.\n"
-                coordinates = featureObject["Coordinates"][0][0]
-            if featureType == "MultiLineString":
-                log += "Mapping a line feature of group " + featureObject["Group"] + " to a Euroscope freetext point, only the first coordinate will be considered.\n"
-                coordinates = featureObject["Coordinates"][0]
+        if featureType in ["Point","MultiPoint"]:
+            geometry = flattenGeometry(featureObject["Coordinates"],featureType)
+        elif featureType in ["LineString","MultiLineString","Polygon","MultiPolygon"]:
+            log += "Mapping a " + ("polygon" if "Polygon" in featureType else "line") + " feature of group " + featureObject["Group"] + " to a Euroscope freetext point, only the first coordinate will be considered.\n"
+            geometry = flattenGeometry(featureObject["Coordinates"],featureType)
+            geometry = {"Vertices":geometry["Vertices"][:1],"Ring Offsets":[0,1],"Part Offsets":[0,1],"Formatted":geometry["Formatted"][:1]}
         else:
-            coordinates = featureObject["Coordinates"]
+            log += "Tried mapping a feature of unknown type of group " + featureObject["Group"] + " to a Euroscope freetext point.\n"
     else:
         log += ("Something went wrong with a feature object at " + featureObject["Group"] + " which has an invalid feature type (" + featureObject["Feature Type"] + ")" + "\n")
+
+    if geometry == None:
+        log += "Found a feature of unknown geometry type " + str(featureType) + " in group " + featureObject["Group"] + ", skipping.\n"
+        geometry = -1
+    featureObject["Flattened Geometry"] = geometry
+    return geometry
+
+# This is the function that does most of the heavy lifting, it takes a dictionary that contains all the necessary data read from the geoJSON input file and 
+# mapped to more applicable categories through the definitions file and converts it into a multi-line string in the correct format for EuroScope
+
+def formatFeatureForES (featureObject,featureType,debugging=False):
+
+    global log
+
+    # Initially we need to check which category of ES object we're writing to as the formatting conventions in EuroScope / VRC aren't exactly standardized
+    # First step is to format the color of the object for Euroscope, as at least this part is common to all object formats
+
+    color = featureObject["Color"]
+    if not color.isdecimal():
+        color = "COLOR_" + color
+
+    # Secondly we get the flattened geometry, which has all the vertices already converted and tells us where each ring and part starts
+
+    geometry = featureGeometry(featureObject,featureType,debugging)
+    if geometry == -1:
         return -1
-    
+    formatted = geometry["Formatted"]
+    ringOffsets = geometry["Ring Offsets"]
+    partOffsets = geometry["Part Offsets"]
+
     # Here we assign a priority to certain layers. This should only be defined for regions layers, however if it happens for any other layers it doesn't 
     # matter, it'll just be disregarded
 
@@ -225,45 +317,37 @@ def formatFeatureForES (featureObject,featureType,debugging=False):
                 "Formatted Region":""
             }
         if debugging:
-            log += ("This Region Feature has a length of " + str(len(coordinates)) + "\n")
-
-        # I have to make sure I catch any possible holes in the polygon, those would be a second item in the enclosing 
-        # list for the multipolygon feature in the geoJSON, so I iterate over the list containing the coordinate lists
-
-        for i in range(len(coordinates)):
-            if debugging:
-                log += ("  Currently working on layer " + str(i + 1) + "/" + str(len(coordinates)) + "\n")
-
-            # Defining the current coordinate list as the current item in the list of all coordinate lists
+            log += ("This Region Feature has " + str(len(partOffsets) - 1) + " parts and " + str(len(ringOffsets) - 1) + " rings\n")
 
-            currentCoordsList = coordinates[i]
+        # Every part of a multipolygon becomes its own region. I have to make sure I catch any possible holes in each part, those are the rings after the
+        # first one of the part, so I iterate over the rings of each part
 
-            # Set the color for all objects except for the base layer object to the defined hole color
-
-            if not i == 0:
+        for part in range(len(partOffsets) - 1):
+            for ring in range(partOffsets[part], partOffsets[part + 1]):
                 if debugging:
-                    log += ("    Setting Color to grass for hole" + "\n")
-                #color = "11823615"    # Hot Pink for debugging purposes
-                color = "COLOR_" + definitions["Colors"]["Hole Color"]
-            
-            # Figure out what the first set of coordinates is as those are prefixed with the color for the entire region
+                    log += ("  Currently working on layer " + str(ring - partOffsets[part] + 1) + "/" + str(partOffsets[part + 1] - partOffsets[part]) + " of part " + str(part + 1) + "\n")
 
-            firstCoords = decimalDegreesToESNotation(currentCoordsList[0])
+                # Set the color for the outline of each part to the feature color and for all holes to the defined hole color
 
-            # Create the string with the feature, initializing by creating the region name header and the first line with the color prefix
-
-            coordinateText = "REGIONNAME " + featureObject["Group"] + "\n" + (color).ljust(27) + firstCoords + "\n"
+                ringColor = color
+                if not ring == partOffsets[part]:
+                    if debugging:
+                        log += ("    Setting Color to grass for hole" + "\n")
+                    #ringColor = "11823615"    # Hot Pink for debugging purposes
+                    ringColor = "COLOR_" + definitions["Colors"]["Hole Color"]
 
-            # For all further coordinates I can just chuck them into the string after justifying them according to the convention
+                # Create the string with the feature, initializing by creating the region name header and the first line with the color prefix. For all
+                # further coordinates I can just chuck them into the string after justifying them according to the convention, the closing coordinate
+                # is left out as EuroScope closes the region by itself
 
-            for coordinatePair in currentCoordsList[1:-1]:
-                formattedCoords = decimalDegreesToESNotation(coordinatePair)
-                coordString = formattedCoords.rjust(56) + "\n"
-                coordinateText += coordString
+                start = ringOffsets[ring]
+                end = ringOffsets[ring + 1]
+                coordinateText = "REGIONNAME " + featureObject["Group"] + "\n" + (ringColor).ljust(27) + formatted[start] + "\n"
+                coordinateText += "".join(formattedCoords.rjust(56) + "\n" for formattedCoords in formatted[start + 1:end - 1])
 
-            # Finally, I can append the created string to the feature dict
+                # Finally, I can append the created string to the feature dict
 
-            featureDict["Formatted Region"] += coordinateText
+                featureDict["Formatted Region"] += coordinateText
 
         # And then return that feature dict to the calling function
 
@@ -273,34 +357,34 @@ def formatFeatureForES (featureObject,featureType,debugging=False):
 
     elif featureObject["ES Category"] == 'geo':
 
-        # Same principle as above, I need the first coordinate pair to prefix the feature name
-
-        # Again here I initialize the string to be written into the sector file
+        # Again here I initialize the string to be written into the sector file, every line and every ring of every part is its own run of segments
 
         coordinateText = ""
-        for element in coordinates:
-            firstCoords = decimalDegreesToESNotation(element[0]) + " " + decimalDegreesToESNotation(element[1])
+        for ring in range(len(ringOffsets) - 1):
+            start = ringOffsets[ring]
+            end = ringOffsets[ring + 1]
+            if end - start < 2:
+                continue
 
-            coordinateText += featureObject["Group"].ljust(41) + firstCoords + " " + color + "\n"
+            # Same principle as above, I need the first coordinate pair to prefix the feature name
+
+            coordinateText += featureObject["Group"].ljust(41) + formatted[start] + " " + formatted[start + 1] + " " + color + "\n"
 
             # Now I iterate over all the elements in the coordinate list of the feature. As 
             # EuroScope treats all lines as a group of individual line segments I need to draw each 
             # segment, consisting of two coordinates, separately.
 
-            for i in range(len(element) - 2):
-                thisCoord = decimalDegreesToESNotation(element[i + 1])
-                nextCoord = decimalDegreesToESNotation(element[i + 2])
-                coordinateText += (thisCoord + " " + nextCoord).rjust(100) + " " + color + "\n"
+            coordinateText += "".join((formatted[i] + " " + formatted[i + 1]).rjust(100) + " " + color + "\n" for i in range(start + 1, end - 1))
 
         # Here I'm doing the lazy thing and only return the coordinate string, but I'll catch that in the next function
 
         return coordinateText
 
-    # And lastly, freetext, which is the simplest of the feature types as it only covers one point per item
+    # And lastly, freetext, which is the simplest of the feature types as it only covers one point per item, or one per part for multipoints
 
     elif featureObject["ES Category"] == "freetext":
         if "Label" in featureObject:
-            outputText = decimalDegreesToESNotation(coordinates).replace(" ",":") + ":" + featureObject["Group"] + ":" + featureObject["Label"] + "\n"
+            outputText = "".join(formattedCoords.replace(" ",":") + ":" + featureObject["Group"] + ":" + featureObject["Label"] + "\n" for formattedCoords in formatted)
             return outputText
         else:
             log += "Missing label attribute for a freetext feature of group " + featureObject["Group"] + ", skipping feature.\n"
@@ -326,46 +410,15 @@ def formatFeatureForGng (featureObject,featureType,debugging=False):
     if not color.isdecimal():
         color = "COLOR_" + color
 
-    # Secondly we check what kind of a feature type we're dealing with and extracting the coordinate list accordingly, this is necessary due to a nesting 
-    # quirk of GeoJSON where polygons are nested deeper than lines, which are nested deeper than points. The check for holes in polygons has already been
-    # implemented, they are currently assigned a fixed color from the definitions.
-
-    if debugging:
-        log += ("Feature Type of working feature is: " + featureObject["Feature Type"] + "\n")
+    # Secondly we get the flattened geometry, which has usually already been created by the EuroScope formatter
 
-    if len(featureObject["Coordinates"]) == 0:
-        log += "Found an empty feature of group " + featureObject["Group"] + ", skipping." + "\n"
-        return -1
-    if featureObject["Feature Type"] == "Polygon":
-        if not featureType == "MultiPolygon":
-            log += "Tried mapping a feature of group " + featureObject["Group"] + " that isn't a polygon to a Euroscope region.\n"
-            return -1
-        coordinates = featureObject["Coordinates"][0]
-    elif featureObject["Feature Type"] == "Line":
-        if not featureType == "MultiLineString":
-            if featureType == "MultiPolygon":
-                log += "Mapping a polygon feature of group " + featureObject["Group"] + " to a Euroscope geo line, holes may be lost in the process.\n"
-                coordinates = featureObject["Coordinates"][0]
-            elif featureType == "LineString":
-                coordinates = [featureObject["Coordinates"]]
-            else:
-                log += "Tried mapping a point feature or a feature of unknown type of group " + featureObject["Group"] + " to a Euroscope geo line.\n"
-                return -1
-        else:
-            coordinates = featureObject["Coordinates"]
-    elif featureObject["Feature Type"] == "Point":
-        if not featureType == "Point":
-            if featureType == "MultiPolygon":
-                log += "Mapping a polygon feature of group " + featureObject["Group"] + " to a Euroscope freetext point, only the first coordinate will be considered.\n"
-                coordinates = featureObject["Coordinates"][0][0]
-            if featureType == "MultiLineString":
-                log += "Mapping a line feature of group " + featureObject["Group"] + " to a Euroscope freetext point, only the first coordinate will be considered.\n"
-                coordinates = featureObject["Coordinates"][0]
-        else:
-            coordinates = featureObject["Coordinates"]
-    else:
-        log += ("Something went wrong with a feature object at " + featureObject["Group"] + " which has an invalid feature type (" + featureObject["Feature Type"] + ")" + "\n")
+    geometry = featureGeometry(featureObject,featureType,debugging)
+    if geometry == -1:
         return -1
+    formatted = geometry["Formatted"]
+    ringOffsets = geometry["Ring Offsets"]
+    partOffsets = geometry["Part Offsets"]
+
     if "Priority" in featureObject:
         priority = featureObject["Priority"]
 
@@ -381,42 +434,31 @@ def formatFeatureForGng (featureObject,featureType,debugging=False):
                 "Formatted Region":""
             }
         if debugging:
-            log += ("This Region Feature has a length of " + str(len(coordinates)) + "\n")
-
-        # I have to make sure I catch any possible holes in the polygon, those would be a second item in the enclosing 
-        # list for the multipolygon feature in the geoJSON, so I iterate over the list containing the coordinate lists
-
-        for i in range(len(coordinates)):
-            if debugging:
-                log += ("  Currently working on layer " + str(i + 1) + "/" + str(len(coordinates)) + "\n")
-
-            # Defining the current coordinate list as the current item in the list of all coordinate lists
+            log += ("This Region Feature has " + str(len(partOffsets) - 1) + " parts and " + str(len(ringOffsets) - 1) + " rings\n")
 
-            currentCoordsList = coordinates[i]
+        # Every part of a multipolygon becomes its own region, with its holes being the rings after the first one of the part
 
-            # Set the color for all objects except for the base layer object to grass
-
-            if not i == 0:
+        for part in range(len(partOffsets) - 1):
+            for ring in range(partOffsets[part], partOffsets[part + 1]):
                 if debugging:
-                    log += ("    Setting Color to grass for hole" + "\n")
-                #color = "11823615"    # Hot Pink for debugging purposes
-                color = "COLOR_AoRground1"
-            
+                    log += ("  Currently working on layer " + str(ring - partOffsets[part] + 1) + "/" + str(partOffsets[part + 1] - partOffsets[part]) + " of part " + str(part + 1) + "\n")
 
-            # Create the string with the feature, initializing by creating the region name header and the first line with the color prefix
+                # Set the color for the outline of each part to the feature color and for all holes to the defined hole color
 
-            coordinateText = color + "\n"
+                ringColor = color
+                if not ring == partOffsets[part]:
+                    if debugging:
+                        log += ("    Setting Color to grass for hole" + "\n")
+                    #ringColor = "11823615"    # Hot Pink for debugging purposes
+                    ringColor = "COLOR_" + definitions["Colors"]["Hole Color"]
 
-            # For all further coordinates I can just chuck them into the string after justifying them according to the convention
+                # Create the string with the feature, initializing with the color line, then all the coordinates one per line
 
-            for coordinatePair in currentCoordsList:
-                formattedCoords = decimalDegreesToESNotation(coordinatePair)
-                coordString = formattedCoords + "\n"
-                coordinateText += coordString
+                coordinateText = ringColor + "\n" + "".join(formattedCoords + "\n" for formattedCoords in formatted[ringOffsets[ring]:ringOffsets[ring + 1]])
 
-            # Finally, I can append the created string to the feature dict
+                # Finally, I can append the created string to the feature dict
 
-            featureDict["Formatted Region"] += coordinateText
+                featureDict["Formatted Region"] += coordinateText
 
         # And then return that feature dict to the calling function
 
@@ -426,34 +468,29 @@ def formatFeatureForGng (featureObject,featureType,debugging=False):
 
     elif featureObject["ES Category"] == 'geo':
 
-        # Same principle as above, I need the first coordinate pair to prefix the feature name
-
         # Again here I initialize the string to be written into the sector file
         airportICAO = featureObject["Group"][:4]
         restOfGroup = featureObject["Group"][5:].rsplit(" ")
         featureDict = {"Group":featureObject["Group"],"Airport":airportICAO,"Category":restOfGroup[0],"Name":" ".join(restOfGroup[1:]),"Code":""}
-        for element in coordinates:
+        for ring in range(len(ringOffsets) - 1):
             
-            # Now I iterate over all the elements in the coordinate list of the feature. As 
+            # Now I iterate over all the elements in the coordinate list of every line and ring. As 
             # EuroScope treats all lines as a group of individual line segments I need to draw each 
             # segment, consisting of two coordinates, separately.
 
-            for i in range(len(element) - 1):
-                thisCoord = decimalDegreesToESNotation(element[i])
-                nextCoord = decimalDegreesToESNotation(element[i + 1])
-                featureDict["Code"] += (thisCoord + " " + nextCoord) + " " + color + "\n"
+            featureDict["Code"] += "".join(formatted[i] + " " + formatted[i + 1] + " " + color + "\n" for i in range(ringOffsets[ring], ringOffsets[ring + 1] - 1))
 
         # Here I'm doing the lazy thing and only return the coordinate string, but I'll catch that in the next function
 
         return featureDict
 
-    # And lastly, freetext, which is the simplest of the feature types as it only covers one point per item
+    # And lastly, freetext, which is the simplest of the feature types as it only covers one point per item, or one per part for multipoints
 
     elif featureObject["ES Category"] == "freetext":
         if "Label" in featureObject:
             airportICAO = featureObject["Group"][:4]
             labelgroup = featureObject["Group"][5:]
-            outputText = decimalDegreesToESNotation(coordinates).replace(" ",":") + "::" + featureObject["Label"]
+            outputText = "\n".join(formattedCoords.replace(" ",":") + "::" + featureObject["Label"] for formattedCoords in formatted)
             featureDict = {"Group":featureObject["Group"],"Airport":airportICAO,"Labelgroup":labelgroup,"Code":outputText}
             return featureDict
         else:
@@ -466,7 +503,6 @@ def formatFeatureForGng (featureObject,featureType,debugging=False):
 
     return -1
 
-
 # This is just a helper function to assign a feature its attributes from the definitions file
 
 def categoryMapping(category,airport,debugging = False):
@@ -556,20 +592,271 @@ def esColorCode(colorHex,debugging = False):
         log += ("Color Hex value #" + hexString + " converted to Red: " + str(red) + ", Green: " + str(green) + ", Blue: " + str(blue) + "\n")
     return decString
 
+# QGIS doesn't always write CRS84, our surveyors for example deliver their data in the Swiss LV95 grid. This helper reads the declared coordinate
+# reference system from the crs member of the GeoJSON header and boils it down to a short code, files without a crs member are CRS84 by definition.
+
+def readCRS(data):
+    if not "crs" in data or data["crs"] == None:
+        return "CRS84"
+    crsName = str(data["crs"]["properties"]["name"])
+    if search("CRS84$",crsName):
+        return "CRS84"
+    crsCode = search("([0-9]+)$",crsName)
+    if crsCode == None:
+        return crsName
+    return "EPSG:" + crsCode.group(1)
+
+# Another helper that digs through the nesting of a GeoJSON coordinate list and collects every coordinate pair, so that all pairs of a file can be 
+# reprojected in one go. The pairs are collected by reference, so writing to them changes the original coordinate list.
+
+def collectCoordinatePairs(coordinates,pairs):
+    if len(coordinates) > 0 and isinstance(coordinates[0],list):
+        for item in coordinates:
+            collectCoordinatePairs(item,pairs)
+    elif len(coordinates) >= 2:
+        pairs.append(coordinates)
+
+# These are the ellipsoid constants needed for the Swiss grids, the Swiss projection is an oblique Mercator projection on the Bessel 1841 ellipsoid
+# centered on the old observatory in Bern. The formulas are the rigorous ones from the swisstopo documentation, not the approximations.
+
+besselA = 6377397.155
+besselE2 = 0.006674372230614
+besselE = math.sqrt(besselE2)
+swissPhi0 = math.radians(46 + 57 / 60 + 8.66 / 3600)
+swissLambda0 = math.radians(7 + 26 / 60 + 22.5 / 3600)
+swissR = besselA * math.sqrt(1 - besselE2) / (1 - besselE2 * math.sin(swissPhi0) ** 2)
+swissAlpha = math.sqrt(1 + besselE2 / (1 - besselE2) * math.cos(swissPhi0) ** 4)
+swissB0 = math.asin(math.sin(swissPhi0) / swissAlpha)
+swissK = (math.log(math.tan(math.pi / 4 + swissB0 / 2)) - swissAlpha * math.log(math.tan(math.pi / 4 + swissPhi0 / 2))
+    + swissAlpha * besselE / 2 * math.log((1 + besselE * math.sin(swissPhi0)) / (1 - besselE * math.sin(swissPhi0))))
+wgs84A = 6378137.0
+wgs84E2 = 0.00669437999014
+
+# This converts whole lists of Swiss grid coordinates to WGS84 lon/lat. The false easting and northing differ between LV03 and LV95, the shift is the
+# translation from the Swiss datum to WGS84. Everything is done on entire lists at once instead of pair by pair to keep the loops as tight as possible.
+
+def swissGridToWGS84(eastings,northings,falseEasting,falseNorthing,shift):
+
+    # First we invert the projection onto the sphere, then rotate the sphere back from the oblique system into the normal one
+
+    lBar = [(easting - falseEasting) / swissR for easting in eastings]
+    bBar = [2 * (math.atan(math.exp((northing - falseNorthing) / swissR)) - math.pi / 4) for northing in northings]
+    sinB0 = math.sin(swissB0)
+    cosB0 = math.cos(swissB0)
+    b = [math.asin(cosB0 * math.sin(bb) + sinB0 * math.cos(bb) * math.cos(lb)) for lb, bb in zip(lBar,bBar)]
+    lambdas = [swissLambda0 + math.atan2(math.sin(lb), cosB0 * math.cos(lb) - sinB0 * math.tan(bb)) / swissAlpha for lb, bb in zip(lBar,bBar)]
+
+    # The latitude on the ellipsoid has to be found iteratively, three iterations get us to a few millionths of an arc second
+
+    isometric = [(math.log(math.tan(math.pi / 4 + sphereLatitude / 2)) - swissK) / swissAlpha for sphereLatitude in b]
+    phis = list(b)
+    for iteration in range(3):
+        phis = [2 * math.atan(math.exp(iso + besselE * math.log(math.tan(math.pi / 4 + math.asin(besselE * math.sin(phi)) / 2)))) - math.pi / 2 for iso, phi in zip(isometric,phis)]
+
+    # And lastly the datum shift, via geocentric coordinates on the Bessel ellipsoid which are translated and converted back on the WGS84 ellipsoid
+
+    n = [besselA / math.sqrt(1 - besselE2 * math.sin(phi) ** 2) for phi in phis]
+    x = [ni * math.cos(phi) * math.cos(lam) + shift[0] for ni, phi, lam in zip(n,phis,lambdas)]
+    y = [ni * math.cos(phi) * math.sin(lam) + shift[1] for ni, phi, lam in zip(n,phis,lambdas)]
+    z = [ni * (1 - besselE2) * math.sin(phi) + shift[2] for ni, phi in zip(n,phis)]
+    return geocentricToWGS84(x,y,z)
+
+# Converts lists of geocentric coordinates to WGS84 lon/lat in degrees, this uses Bowring's formula which is accurate to a fraction of a millimetre
+# for points near the surface of the earth.
+
+def geocentricToWGS84(x,y,z):
+    b = wgs84A * math.sqrt(1 - wgs84E2)
+    ep2 = wgs84E2 / (1 - wgs84E2)
+    p = [math.hypot(xi,yi) for xi, yi in zip(x,y)]
+    theta = [math.atan2(zi * wgs84A, pi * b) for zi, pi in zip(z,p)]
+    longitudes = [math.degrees(math.atan2(yi,xi)) for xi, yi in zip(x,y)]
+    latitudes = [math.degrees(math.atan2(zi + ep2 * b * math.sin(t) ** 3, pi - wgs84E2 * wgs84A * math.cos(t) ** 3)) for zi, pi, t in zip(z,p,theta)]
+    return longitudes, latitudes
+
+# Web mercator is a lot simpler as it's a plain spherical mercator on the WGS84 semi-major axis
+
+def webMercatorToWGS84(eastings,northings):
+    longitudes = [math.degrees(easting / wgs84A) for easting in eastings]
+    latitudes = [math.degrees(2 * math.atan(math.exp(northing / wgs84A)) - math.pi / 2) for northing in northings]
+    return longitudes, latitudes
+
+# A quick check whether we can reproject a given CRS
+
+def crsSupported(crs):
+    return crs in ["EPSG:2056","EPSG:21781","EPSG:3857","EPSG:900913","EPSG:3785","EPSG:102100"]
+
+# This function takes a list of coordinate pairs and reprojects them into WGS84 lon/lat in place, it returns False if the CRS isn't supported
+
+def reprojectCoordinatePairs(pairs,crs):
+    eastings = [pair[0] for pair in pairs]
+    northings = [pair[1] for pair in pairs]
+    if crs == "EPSG:2056":
+        longitudes, latitudes = swissGridToWGS84(eastings,northings,2600000,1200000,(674.374,15.056,405.346))
+    elif crs == "EPSG:21781":
+        longitudes, latitudes = swissGridToWGS84(eastings,northings,600000,200000,(674.374,15.056,405.346))
+    elif crs in ["EPSG:3857","EPSG:900913","EPSG:3785","EPSG:102100"]:
+        longitudes, latitudes = webMercatorToWGS84(eastings,northings)
+    else:
+        return False
+    for pair, longitude, latitude in zip(pairs,longitudes,latitudes):
+        pair[0] = longitude
+        pair[1] = latitude
+    return True
+
+# QGIS writes its GeoJSON files with one feature per line. This lets us split a file into its features without decoding them, so that later on we only
+# need to decode the properties of a feature to decide whether we want it at all. If the file doesn't look like that we return None and the file is
+# decoded as a whole instead.
+
+def splitGeoJSONLines(text):
+    lines = text.split("\n")
+    for i in range(len(lines)):
+        if lines[i].strip() == '"features": [':
+            try:
+                header = loads("\n".join(lines[:i]) + '"features": [] }')
+            except ValueError:
+                return None
+            break
+    else:
+        return None
+
+    featureLines = []
+    for line in lines[i + 1:]:
+        line = line.strip()
+        if line.startswith("{"):
+            featureLines.append(line.rstrip(","))
+        elif not line in ["","]","}"]:
+            return None
+    return header, featureLines
+
+# This decodes only the properties of a single feature line. The geometry stays undecoded in the line, we only remember where it starts so it can be decoded
+# once we know we actually need it. Lines that aren't laid out the way QGIS writes them are just decoded in full.
+
+def decodeFeatureLine(line):
+    propertiesStart = line.find('"properties": ')
+    if propertiesStart < 0:
+        return loads(line)
+    properties, propertiesEnd = jsonDecoder.raw_decode(line,propertiesStart + len('"properties": '))
+    geometryStart = line.find('"geometry": ',propertiesEnd)
+    if geometryStart < 0:
+        return loads(line)
+    geometryStart += len('"geometry": ')
+    if line.startswith("null",geometryStart):
+        return {"properties":properties,"geometry":None}
+    return {"properties":properties,"geometry":{"Line":line,"Index":geometryStart}}
+
+# And this is where the geometry of a parsed feature finally gets decoded and reprojected if necessary. This only happens the first time the geometry
+# is needed, after that the coordinates are kept in the parsed feature so all build configurations can share them.
+
+def decodeGeometry(parsedFeature):
+    if "Coordinates" in parsedFeature:
+        return
+    geometry = parsedFeature["Geometry"]
+    if "Line" in geometry:
+        geometry = jsonDecoder.raw_decode(geometry["Line"],geometry["Index"])[0]
+    parsedFeature["Feature Type"] = geometry["type"]
+    parsedFeature["Coordinates"] = geometry["coordinates"]
+    parsedFeature["Geometry"] = None
+    if crsSupported(parsedFeature["CRS"]):
+        pairs = []
+        collectCoordinatePairs(parsedFeature["Coordinates"],pairs)
+        reprojectCoordinatePairs(pairs,parsedFeature["CRS"])
+
+# EuroScope draws every segment as a straight line between its two coordinates, which for long edges such as CTR boundaries visibly diverges from the
+# great circle between them. This helper works out the great circle midpoints of whole lists of segments at once by averaging the unit vectors of their
+# end points, and how far each of them is from the midpoint of the straight segment in metres.
+
+def greatCircleMidpoints(starts,ends):
+    midpoints = []
+    deviations = []
+    for start, end in zip(starts,ends):
+        lon1 = math.radians(start[0])
+        lat1 = math.radians(start[1])
+        lon2 = math.radians(end[0])
+        lat2 = math.radians(end[1])
+        x = math.cos(lat1) * math.cos(lon1) + math.cos(lat2) * math.cos(lon2)
+        y = math.cos(lat1) * math.sin(lon1) + math.cos(lat2) * math.sin(lon2)
+        z = math.sin(lat1) + math.sin(lat2)
+        midpoint = [math.degrees(math.atan2(y,x)), math.degrees(math.atan2(z,math.hypot(x,y)))]
+        straightLon = (start[0] + end[0]) / 2
+        straightLat = (start[1] + end[1]) / 2
+        deviations.append(math.hypot((midpoint[0] - straightLon) * math.cos(math.radians(straightLat)), midpoint[1] - straightLat) * 60 * 1852)
+        midpoints.append(midpoint)
+    return midpoints, deviations
+
+# This densifies a single line or ring. Instead of splitting every segment into a fixed number of pieces, only the segments that deviate too far from the 
+# great circle are split in half, then the new halves are checked again, until every segment is within the allowed deviation. Short segments are therefore
+# left alone and only the long ones get additional points. All segments still to be checked are processed together in each round.
+
+def densifyLine(line,maxDeviation):
+    points = list(line)
+    unchecked = list(range(len(points) - 1))
+    for iteration in range(20):
+        if len(unchecked) == 0:
+            break
+        midpoints, deviations = greatCircleMidpoints([points[i] for i in unchecked],[points[i + 1] for i in unchecked])
+        splits = {}
+        for i, midpoint, deviation in zip(unchecked,midpoints,deviations):
+            if deviation > maxDeviation:
+                splits[i] = midpoint
+        newPoints = []
+        unchecked = []
+        for i in range(len(points) - 1):
+            newPoints.append(points[i])
+            if i in splits:
+                unchecked.append(len(newPoints) - 1)
+                newPoints.append(splits[i])
+                unchecked.append(len(newPoints) - 1)
+        newPoints.append(points[-1])
+        points = newPoints
+    return points
+
+# And this one digs through the nesting of a GeoJSON coordinate list and densifies every line and ring it finds, points are returned as they are
+
+def densifyCoordinates(coordinates,maxDeviation):
+    if len(coordinates) == 0 or not isinstance(coordinates[0],list):
+        return coordinates
+    if len(coordinates[0]) > 0 and isinstance(coordinates[0][0],list):
+        return [densifyCoordinates(item,maxDeviation) for item in coordinates]
+    return densifyLine(coordinates,maxDeviation)
+
 # This is one of the big bois, it reads a single GeoJSON file and parses it into the respective categories
 
 def readGeoJSONFile(path,debugging = False):
 
     global log
 
-    # The first and most obvious step is to actually open and load the file into a dict courtesy of the json library
+    # The first and most obvious step is to actually open the file and split it into its features, if the file isn't laid out one feature per line
+    # we load the whole file into a dict courtesy of the json library
 
     with open (path) as JSONFile:
-        data = load(JSONFile)
+        text = JSONFile.read()
+    splitFile = splitGeoJSONLines(text)
+    if splitFile == None:
+        data = loads(text)
+        features = data["features"]
+    else:
+        data, features = splitFile
+
+    # We need to know what coordinate reference system the file uses, anything that isn't WGS84 lon/lat already has to be reprojected once the geometry
+    # gets decoded
 
-    # Next we step through each feature in the data we loaded. We can safely discard the header as all the information in there is not necessary for our purposes
+    crs = readCRS(data)
+    if not crs in ["CRS84","EPSG:4326","EPSG:4258"] and not crsSupported(crs):
+        log += "Unsupported coordinate reference system " + crs + " in file " + path + ", coordinates are used as they are.\n"
 
-    for feature in data['features']:
+    parseFeatures(features,crs,path,debugging)
+
+# Next we step through each feature in the data we loaded. We can safely discard the header as all the information in there is not necessary for our purposes.
+# The features can either be undecoded feature lines or already decoded features, e.g. the ones sent to the conversion service.
+
+def parseFeatures(features,crs,path,debugging = False):
+
+    global log
+
+    for feature in features:
+
+        if isinstance(feature,str):
+            feature = decodeFeatureLine(feature)
 
         # If there is no geometry defined for the feature it's not relevant for us, we can skip that.
 
@@ -586,7 +873,6 @@ def readGeoJSONFile(path,debugging = False):
         label = feature['properties']['lbl']
         color = feature['properties']['clr']
         category = feature['properties']['cat']
-        featureType = feature["geometry"]["type"]
 
         # If attributes are missing we cannot parse the feature so we log that and skip the feature
 
@@ -598,6 +884,43 @@ def readGeoJSONFile(path,debugging = False):
             log += "Skipping disabled feature in file " + path
             continue
 
+        # Everything up to here doesn't depend on the definitions, so the feature is parked in the parsed features list from where it can be mapped
+        # for any number of build configurations without having to read the file again. The geometry isn't decoded yet, that only happens if the feature
+        # is actually exported.
+
+        parsedFeatures.append({
+            "Path":path,
+            "Airport":airport,
+            "Label":label,
+            "Color":color,
+            "Category":category,
+            "CRS":crs,
+            "Geometry":feature['geometry']
+        })
+
+# This function takes all the parsed features and maps them through the currently loaded definitions, then passes them on to the formatters. Only features
+# matching the selection of the build configuration are exported, and the geometry of all other features is never decoded.
+
+def mapFeatures(debugging = False):
+
+    global log
+
+    selectedFeatures = 0
+    for parsedFeature in parsedFeatures:
+
+        path = parsedFeature["Path"]
+        airport = parsedFeature["Airport"]
+        label = parsedFeature["Label"]
+        color = parsedFeature["Color"]
+        category = parsedFeature["Category"]
+
+        # First we check the airport and category against the selection, as these don't even need the definitions
+
+        if len(selection["Airports"]) > 0 and not airport in selection["Airports"]:
+            continue
+        if len(selection["Categories"]) > 0 and not any(fnmatchcase(str(category),pattern) for pattern in selection["Categories"]):
+            continue
+
         # Now let's use that helper function to map category of the current feature to the attributes found in the definitions
 
         featureObject = categoryMapping(category,airport,debugging)
@@ -613,15 +936,33 @@ def readGeoJSONFile(path,debugging = False):
         if "Ignore" in featureObject:
             if featureObject["Ignore"]:
                 continue
+
+        # The Euroscope category can only be checked against the selection once the feature is mapped
+
+        if len(selection["ES Categories"]) > 0 and not featureObject["ES Category"] in selection["ES Categories"]:
+            continue
+        selectedFeatures += 1
         
-        # Next, let's extract the coordinates of the feature as well. I only do this now to prevent issues with null items
+        # Next, let's extract the coordinates of the feature as well. Only now the geometry is actually decoded, and as the coordinates are shared between all
+        # build configurations they must never be modified
 
-        coordinates = feature['geometry']['coordinates']
+        startTime = perf_counter()
+        decodeGeometry(parsedFeature)
+        coordinates = parsedFeature["Coordinates"]
+        featureType = parsedFeature["Feature Type"]
 
         # Now we can add a few additional attributes to the feature object that are needed for some subfunctions
 
         featureObject["Label"] = label
         featureObject["Coordinates"] = coordinates
+        featureObject["Airport"] = airport
+        featureObject["Input Category"] = category
+
+        # Long boundary lines need additional points so the straight segments EuroScope draws stay close to the great circle, the allowed deviation
+        # is set per category in the definitions. This creates new coordinate lists, so the shared coordinates stay untouched.
+
+        if featureObject.get("Densification",0) > 0:
+            featureObject["Coordinates"] = densifyCoordinates(coordinates,featureObject["Densification"])
         
         # If we have a color assigned in the feature we'll have to overwrite the default colour from the definition
 
@@ -665,32 +1006,223 @@ def readGeoJSONFile(path,debugging = False):
 
         if not featureObject["Color"] in colorsUsed:
             colorsUsed.append(featureObject["Color"])
+        profileFeature(featureObject,{"Time (ms)":(perf_counter() - startTime) * 1000})
 
-        formattedFeature = formatFeatureForES(featureObject,featureType,debugging)
-        gngFormattedFeature = formatFeatureForGng(featureObject,featureType,debugging)
-        global esData
-        global gngData
+        # Freetext labels are held back if the label density check is enabled, they can only be formatted once we know which of them survive
 
-        # After the feature has been formatted it is then sorted into the correct category
+        if featureObject["ES Category"] == "freetext" and definitions.get("Label Density",{}).get("Enabled",False):
 
-        if not formattedFeature == -1:
-            # print("Key: " + gngFormattedFeature["RegionName"] + "\nObject: " + dumps(gngData[featureObject["ES Category"]]["Features"],indent=1))
-            if featureObject["ES Category"] == "regions":
-                esData[featureObject["ES Category"]]["Features"].append(formattedFeature)
-                if gngFormattedFeature["RegionName"] in gngData[featureObject["ES Category"]]["Features"]:
-                    gngData[featureObject["ES Category"]]["Features"][gngFormattedFeature["RegionName"]].append(gngFormattedFeature)
-                else:
-                    gngData[featureObject["ES Category"]]["Features"][gngFormattedFeature["RegionName"]] = [gngFormattedFeature]
-            else: 
-                esData[featureObject["ES Category"]]["Output String"] += formattedFeature
-                if gngFormattedFeature["Group"] in gngData[featureObject["ES Category"]]["Features"]:
-                    gngData[featureObject["ES Category"]]["Features"][gngFormattedFeature["Group"]]["Code"] += "\n" + gngFormattedFeature["Code"]
-                else:
-                    gngData[featureObject["ES Category"]]["Features"][gngFormattedFeature["Group"]] = gngFormattedFeature
-        else:
-            log += "Skipping feature due to error in formatting from file " + path + "\n"
+            # A multipoint feature places its label at every one of its points, so for the density check every point is treated as a label of its own
+
+            if featureType == "MultiPoint" and featureObject["Feature Type"] == "Point":
+                for point in featureObject["Coordinates"]:
+                    pointObject = dict(featureObject)
+                    pointObject["Coordinates"] = point
+                    labelData.append({"Feature":pointObject,"Feature Type":"Point","Path":path})
+            else:
+                labelData.append({"Feature":featureObject,"Feature Type":featureType,"Path":path})
+            continue
+
+        # The same goes for regions if the region dissolve is enabled, they're only formatted once we know which of them can be merged
+
+        if featureObject["ES Category"] == "regions" and definitions.get("Region Dissolve",{}).get("Enabled",False):
+            regionData.append({"Feature":featureObject,"Feature Type":featureType,"Path":path})
+            continue
+
+        addFeatureToOutput(featureObject,featureType,path,debugging)
+
+    log += "Selected " + str(selectedFeatures) + " of " + str(len(parsedFeatures)) + " features for export.\n"
+
+# To see which groups are responsible for the size of the sectorfile, everything that is emitted is counted in the output profile. Every count is added
+# to the group, the category with its first suffix and the airport of the feature, so the same numbers can be looked at from all three sides.
+
+def profileFeature(featureObject,counts):
+    if not definitions.get("Output Profile",{}).get("Enabled",False):
+        return
+    keys = {
+        "Group":featureObject["Group"],
+        "Category":"_".join(str(featureObject.get("Input Category")).split("_")[:2]),
+        "Airport":featureObject.get("Airport")
+    }
+    for table in keys:
+        entry = profileData.setdefault(table,{}).setdefault(str(keys[table]),dict.fromkeys(profileColumns,0))
+        for column in counts:
+            entry[column] += counts[column]
+
+# This works out the counts of a single formatted feature. The vertices and segments are counted the way EuroScope gets them, so regions don't count the
+# closing coordinate as EuroScope closes them by itself, and single coordinates of a line don't count at all as they're never drawn.
+
+def emissionCounts(featureObject,formattedFeature,gngFormattedFeature,formattingTime):
+    geometry = featureObject["Flattened Geometry"]
+    ringOffsets = geometry["Ring Offsets"]
+    lengths = [ringOffsets[i + 1] - ringOffsets[i] for i in range(len(ringOffsets) - 1)]
+    counts = {"Features":1,"Time (ms)":formattingTime}
+    if featureObject["ES Category"] == "regions":
+        counts["Vertices"] = sum(length - 1 for length in lengths)
+        counts["Segments"] = counts["Vertices"]
+        counts["SCT Bytes"] = len(formattedFeature["Formatted Region"])
+        counts["GNG Bytes"] = len(gngFormattedFeature["Formatted Region"])
+    elif featureObject["ES Category"] == "geo":
+        counts["Vertices"] = sum(length for length in lengths if length > 1)
+        counts["Segments"] = sum(length - 1 for length in lengths if length > 1)
+        counts["SCT Bytes"] = len(formattedFeature)
+        counts["GNG Bytes"] = len(gngFormattedFeature["Code"]) + 1
+    else:
+        counts["Vertices"] = len(geometry["Vertices"])
+        counts["ESE Bytes"] = len(formattedFeature)
+        counts["GNG Bytes"] = len(gngFormattedFeature["Code"]) + 1
+    return counts
+
+# The budgets in the definitions are checked once everything has been emitted. A budget applies to every group matching its name, which may contain
+# wildcards, so "* Groundlayout" covers the ground layouts of all airports at once.
+
+def checkBudgets():
+    global log
+    budgets = definitions.get("Output Profile",{}).get("Budgets",{})
+    for group in profileData.get("Group",{}):
+        entry = profileData["Group"][group]
+        entry["Over Budget"] = []
+        for pattern in budgets:
+            if not fnmatchcase(group,pattern):
+                continue
+            for column in budgets[pattern]:
+                if column in entry and entry[column] > budgets[pattern][column] and not column in entry["Over Budget"]:
+                    entry["Over Budget"].append(column)
+                    log += "Group " + group + " exceeds its budget of " + str(budgets[pattern][column]) + " " + column + " with " + str(round(entry[column],3)) + ".\n"
+
+# This function formats a single mapped feature for both EuroScope and GNG and then sorts it into the correct category
+
+def addFeatureToOutput(featureObject,featureType,path,debugging = False):
+
+    global esData
+    global gngData
+    global log
+
+    # Very large regions are split into tiles first if the region tiling is enabled, every tile is then passed through here as its own feature
+
+    if featureObject["ES Category"] == "regions" and featureType in ["Polygon","MultiPolygon"] and featureObject.get("Tile Size",0) > 0 and definitions.get("Region Tiling",{}).get("Enabled",False):
+        startTime = perf_counter()
+        tiles = tileRegion(featureObject,featureType,debugging)
+        profileFeature(featureObject,{"Time (ms)":(perf_counter() - startTime) * 1000})
+        if not tiles == None:
+            for tile in tiles:
+                addFeatureToOutput(tile,featureType,path,debugging)
+            return
+
+    startTime = perf_counter()
+    formattedFeature = formatFeatureForES(featureObject,featureType,debugging)
+    gngFormattedFeature = formatFeatureForGng(featureObject,featureType,debugging)
+    formattingTime = (perf_counter() - startTime) * 1000
+
+    # After the feature has been formatted it is then sorted into the correct category
+
+    if not formattedFeature == -1:
+        # print("Key: " + gngFormattedFeature["RegionName"] + "\nObject: " + dumps(gngData[featureObject["ES Category"]]["Features"],indent=1))
+        if featureObject["ES Category"] == "regions":
+            esData[featureObject["ES Category"]]["Features"].append(formattedFeature)
+            if gngFormattedFeature["RegionName"] in gngData[featureObject["ES Category"]]["Features"]:
+                gngData[featureObject["ES Category"]]["Features"][gngFormattedFeature["RegionName"]].append(gngFormattedFeature)
+            else:
+                gngData[featureObject["ES Category"]]["Features"][gngFormattedFeature["RegionName"]] = [gngFormattedFeature]
+        else: 
+            esData[featureObject["ES Category"]]["Output String"] += formattedFeature
+            if gngFormattedFeature["Group"] in gngData[featureObject["ES Category"]]["Features"]:
+                gngData[featureObject["ES Category"]]["Features"][gngFormattedFeature["Group"]]["Code"] += "\n" + gngFormattedFeature["Code"]
+            else:
+                gngData[featureObject["ES Category"]]["Features"][gngFormattedFeature["Group"]] = gngFormattedFeature
+        profileFeature(featureObject,emissionCounts(featureObject,formattedFeature,gngFormattedFeature,formattingTime))
+    else:
+        log += "Skipping feature due to error in formatting from file " + path + "\n"
             
 
+# EuroScope redraws a whole region even if only a corner of it is on screen, so very large regions with thousands of coordinates are expensive at ground
+# radar zoom. The region tiling cuts such regions into the cells of a regular grid, which EuroScope can skip when they're off screen. The grid lines lie on
+# fixed multiples of the tile size, so neighbouring tiles share exactly the same edge coordinates and no seams are visible.
+
+# This is the Sutherland-Hodgman step, it cuts a ring along a single grid line and returns the parts on either side of it. Both parts are built in the same
+# pass over the ring. The axis is 0 for a vertical line at a longitude and 1 for a horizontal line at a latitude.
+
+def splitRing(ring,axis,value):
+    lower = []
+    upper = []
+    for i in range(len(ring)):
+        current = ring[i]
+        previous = ring[i - 1]
+        if (previous[axis] < value) != (current[axis] < value):
+            t = (value - previous[axis]) / (current[axis] - previous[axis])
+            crossing = [previous[0] + t * (current[0] - previous[0]), previous[1] + t * (current[1] - previous[1])]
+            crossing[axis] = value
+            lower.append(crossing)
+            upper.append(crossing)
+        if current[axis] < value:
+            lower.append(current)
+        else:
+            upper.append(current)
+    return lower, upper
+
+# This cuts a ring into grid cells. Instead of clipping the ring against every single cell, the ring is split in half along the grid line closest to its
+# middle and both halves are split again until every piece fits into one cell, so every coordinate only goes through a few splits.
+
+def tileRing(ring,cellWidth,cellHeight,tiles):
+    if len(ring) < 3:
+        return
+    box = ringBox(ring)
+    columns = (math.floor(box[0] / cellWidth + 1e-9), math.ceil(box[2] / cellWidth - 1e-9))
+    rows = (math.floor(box[1] / cellHeight + 1e-9), math.ceil(box[3] / cellHeight - 1e-9))
+    if columns[1] - columns[0] <= 1 and rows[1] - rows[0] <= 1:
+        tiles.append(ring)
+        return
+    if columns[1] - columns[0] >= rows[1] - rows[0]:
+        lower, upper = splitRing(ring,0,((columns[0] + columns[1]) // 2) * cellWidth)
+    else:
+        lower, upper = splitRing(ring,1,((rows[0] + rows[1]) // 2) * cellHeight)
+    tileRing(lower,cellWidth,cellHeight,tiles)
+    tileRing(upper,cellWidth,cellHeight,tiles)
+
+# And this decides whether a region needs to be tiled at all and if so returns a list of tile features. Every part of a multipolygon is tiled on its own,
+# the outline with the region color and any holes with the hole color right after it, so the layering stays the same. If the region is small enough None
+# is returned.
+
+def tileRegion(featureObject,featureType,debugging = False):
+
+    global log
+
+    settings = definitions["Region Tiling"]
+    parts = featureObject["Coordinates"]
+    if featureType == "Polygon":
+        parts = [parts]
+    parts = [rings for rings in parts if len(rings) > 0 and len(rings[0]) >= 4]
+    if len(parts) == 0:
+        return None
+    box = ringBox([pair for rings in parts for pair in rings[0]])
+    latitudeScale = math.cos(math.radians((box[1] + box[3]) / 2))
+    area = sum(math.fabs(ringArea(rings[0])) for rings in parts) * latitudeScale * (60 * 1.852) ** 2
+    vertices = sum(len(ring) for rings in parts for ring in rings)
+    if vertices <= settings["Vertex Threshold"] and area <= settings["Area Threshold"]:
+        return None
+
+    cellHeight = featureObject["Tile Size"] / (60 * 1852)
+    cellWidth = cellHeight / latitudeScale
+
+    tiles = []
+    for rings in parts:
+        for i in range(len(rings)):
+            pieces = []
+            tileRing([pair[:2] for pair in rings[i][:-1]],cellWidth,cellHeight,pieces)
+            for piece in pieces:
+                if len(piece) < 3 or ringArea(piece + [piece[0]]) == 0:
+                    continue
+                tile = dict(featureObject)
+                tile["Coordinates"] = [piece + [piece[0]]] if featureType == "Polygon" else [[piece + [piece[0]]]]
+                tile["Tile Size"] = 0
+                if not i == 0:
+                    tile["Color"] = definitions["Colors"]["Hole Color"]
+                tiles.append(tile)
+
+    if debugging:
+        log += ("Tiled a region of group " + featureObject["Group"] + " with " + str(vertices) + " coordinates and " + str(round(area,1)) + " km2 into " + str(len(tiles)) + " tiles\n")
+    return tiles
+
 # Regions need to be sorted so that the layering is correct, this is accomplished by sorting the array on the priority attribute 
 # from the definitions file
 
@@ -757,9 +1289,326 @@ def readFolder(folderPath,debugging=False):
                     print("Reading file " + fileName + " in folder " + subdir)
                 readGeoJSONFile(filePath,debugging)
 
-readFolder(geoJSONFolderPath,globalDebugging)
+# Freetext labels at busy aprons tend to overlap, which we'd otherwise only notice by eye in EuroScope. This helper works out the footprint of a label
+# in metres at the reference zoom from the definitions, the box is centered on the label position and converted into a local metric grid.
+
+def labelFootprint(label,debugging = False):
+    feature = label["Feature"]
+    coordinates = feature["Coordinates"]
+
+    # Depending on the geometry type the first coordinate pair is nested more or less deeply, so we dig down until we hit an actual pair
+
+    while len(coordinates) > 0 and isinstance(coordinates[0],list):
+        coordinates = coordinates[0]
+    if len(coordinates) < 2 or feature["Label"] == None:
+        return None
+
+    settings = definitions["Label Density"]
+    metresPerPixel = settings["Reference Zoom"] * 1852 / settings["Screen Width"]
+    halfWidth = len(str(feature["Label"])) * settings["Character Width"] * metresPerPixel / 2
+    halfHeight = settings["Character Height"] * metresPerPixel / 2
+
+    east = coordinates[0] * 60 * 1852 * math.cos(math.radians(coordinates[1]))
+    north = coordinates[1] * 60 * 1852
+
+    return (east - halfWidth, north - halfHeight, east + halfWidth, north + halfHeight)
+
+# Another little helper, it returns all the grid cells a footprint box touches. As the cell size is at least as big as the largest label a box
+# never covers more than four cells.
+
+def gridCells(box,cellSize):
+    cells = []
+    for x in range(math.floor(box[0] / cellSize), math.floor(box[2] / cellSize) + 1):
+        for y in range(math.floor(box[1] / cellSize), math.floor(box[3] / cellSize) + 1):
+            cells.append((x,y))
+    return cells
+
+# This is the label density check itself. All labels are put into a uniform spatial hash grid per group, so that every label is only compared to 
+# the labels in the cells it touches instead of to every other label. Conflicts are written into the log, and if thinning is enabled in the definitions
+# the labels with the lower priority are dropped, with the labels of the highest priority being placed first.
+
+def checkLabelDensity(debugging = False):
+
+    global log
+    global labelData
+
+    settings = definitions["Label Density"]
+    labels = []
+    for label in labelData:
+        label["Box"] = labelFootprint(label,debugging)
+        if not label["Box"] == None:
+            labels.append(label)
+
+    cellSize = 1
+    if len(labels) > 0:
+        cellSize = max(max(label["Box"][2] - label["Box"][0], label["Box"][3] - label["Box"][1]) for label in labels)
+
+    # First pass, find all overlapping pairs within the same group. Each label is only checked against the labels that were inserted before it
+    # so every pair is only reported once.
+
+    grid = {}
+    conflicts = []
+    for i in range(len(labels)):
+        box = labels[i]["Box"]
+        group = labels[i]["Feature"]["Group"]
+        cells = gridCells(box,cellSize)
+        candidates = set()
+        for cell in cells:
+            candidates.update(grid.get((group,) + cell,[]))
+        for j in sorted(candidates):
+            other = labels[j]["Box"]
+            if box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]:
+                conflicts.append((j,i))
+        for cell in cells:
+            grid.setdefault((group,) + cell,[]).append(i)
+
+    # Second pass, if thinning is enabled we place the labels in order of descending priority and drop every label that would overlap one we already placed
+
+    thinned = 0
+    if settings.get("Thinning",False) and len(conflicts) > 0:
+        grid = {}
+        for i in sorted(range(len(labels)), key = lambda index: -labels[index]["Feature"].get("Priority",0)):
+            box = labels[i]["Box"]
+            group = labels[i]["Feature"]["Group"]
+            cells = gridCells(box,cellSize)
+            overlapping = False
+            for cell in cells:
+                for j in grid.get((group,) + cell,[]):
+                    other = labels[j]["Box"]
+                    if box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]:
+                        overlapping = True
+                        break
+                if overlapping:
+                    break
+            if overlapping:
+                labels[i]["Thinned"] = True
+                thinned += 1
+                continue
+            for cell in cells:
+                grid.setdefault((group,) + cell,[]).append(i)
+
+    # Now we can write the report into the log and pass the surviving labels on to the formatter in the order they were read
+
+    log += ("Label density check at a reference zoom of " + str(settings["Reference Zoom"]) + " nm found " + str(len(conflicts)) + " conflicts between " + str(len(labels)) + " labels, " + str(thinned) + " labels thinned.\n")
+    for conflict in conflicts:
+        first = labels[conflict[0]]
+        second = labels[conflict[1]]
+        log += ("  Label \"" + str(first["Feature"]["Label"]) + "\" overlaps \"" + str(second["Feature"]["Label"]) + "\" in group " + first["Feature"]["Group"] + " (" + second["Path"] + ")\n")
+    for label in labelData:
+        if label.get("Thinned",False):
+            log += ("  Thinned label \"" + str(label["Feature"]["Label"]) + "\" in group " + label["Feature"]["Group"] + "\n")
+            continue
+        addFeatureToOutput(label["Feature"],label["Feature Type"],label["Path"],debugging)
+
+    labelData = []
+
+# Tiled apron and grass areas drawn as lots of adjoining polygons end up as thousands of tiny regions that EuroScope has to fill one by one. The region
+# dissolve merges polygons of the same group, color and priority that share edges. First a few geometry helpers, the signed area tells us the orientation
+# of a ring and the box is used for the spatial grid.
+
+def ringArea(ring):
+    area = 0
+    for i in range(len(ring) - 1):
+        area += ring[i][0] * ring[i + 1][1] - ring[i + 1][0] * ring[i][1]
+    return area / 2
+
+def ringBox(ring):
+    longitudes = [pair[0] for pair in ring]
+    latitudes = [pair[1] for pair in ring]
+    return (min(longitudes), min(latitudes), max(longitudes), max(latitudes))
+
+# This turns a GeoJSON ring into a counterclockwise list of vertices without the closing vertex and without any repeated vertices
+
+def orientedRing(ring):
+    vertices = []
+    for pair in ring:
+        vertex = tuple(pair[:2])
+        if len(vertices) == 0 or not vertices[-1] == vertex:
+            vertices.append(vertex)
+    if len(vertices) > 1 and vertices[0] == vertices[-1]:
+        vertices.pop()
+    if ringArea(ring) < 0:
+        vertices.reverse()
+    return vertices
+
+# The outline of a merged region is kept as a dict that points from every vertex to the next one. This function tries to add another polygon to that
+# outline, which only works if the polygon shares one continuous run of edges with the outline and doesn't touch it anywhere else. Otherwise the merged
+# area would have a hole or two parts that only touch at a corner, which EuroScope regions can't represent without changing how the area is drawn.
+# If the polygon can't be added the outline is left untouched and False is returned.
+
+def addRingToOutline(outline,vertices):
+    n = len(vertices)
+    if n < 3 or not len(set(vertices)) == n:
+        return False
+
+    # A shared edge runs the opposite way in the outline as both are counterclockwise
+
+    shared = [outline.get(vertices[(i + 1) % n]) == vertices[i] for i in range(n)]
+    if not any(shared) or all(shared):
+        return False
+    runStarts = [i for i in range(n) if shared[i - 1] and not shared[i]]
+    if not len(runStarts) == 1:
+        return False
+
+    chain = []
+    i = runStarts[0]
+    while not shared[i % n]:
+        chain.append(i % n)
+        i += 1
+    for edge in chain[:-1]:
+        if vertices[(edge + 1) % n] in outline:
+            return False
+
+    for i in range(n):
+        if shared[i]:
+            del outline[vertices[(i + 1) % n]]
+    for edge in chain:
+        outline[vertices[edge]] = vertices[(edge + 1) % n]
+    return True
+
+# And this is the region dissolve itself. Candidates for merging are found through a hash index of all polygon edges, so two polygons are only ever compared
+# if they share an edge. Starting with the first polygon that was read, each merged region then grows through the polygons connected to it by shared
+# edges. The merged region is drawn where its first polygon was read, so a polygon can only join if that doesn't change the layering, i.e. if no region
+# of the same priority that is read in between overlaps it. These overlaps are found through a uniform grid of the region boxes.
+
+def dissolveRegions(debugging = False):
+
+    global log
+    global regionData
+
+    # Only single polygons without holes can be merged, anything else is passed through as it is. The box still has to cover all parts of a multipolygon
+    # as it is used for the layering check further down
+
+    candidates = []
+    for i in range(len(regionData)):
+        feature = regionData[i]["Feature"]
+        parts = feature["Coordinates"]
+        if regionData[i]["Feature Type"] == "Polygon":
+            parts = [parts]
+        regionData[i]["Box"] = None
+        if regionData[i]["Feature Type"] in ["Polygon","MultiPolygon"]:
+            outlines = [rings[0] for rings in parts if len(rings) > 0 and len(rings[0]) > 3]
+            if len(outlines) > 0:
+                regionData[i]["Box"] = ringBox([pair for outline in outlines for pair in outline])
+            if len(parts) == 1 and len(parts[0]) == 1 and len(outlines) == 1:
+                regionData[i]["Outline"] = outlines[0]
+                candidates.append(i)
+
+    # Every edge is put into the index regardless of its direction together with the style, any edge that is found again for a second polygon of the same 
+    # style makes those two polygons neighbours
+
+    neighbours = {}
+    edgeIndex = {}
+    for i in candidates:
+        feature = regionData[i]["Feature"]
+        style = (feature["Group"],feature["Color"],feature.get("Priority"))
+        ring = regionData[i]["Outline"]
+        neighbours[i] = []
+        for j in range(len(ring) - 1):
+            start = tuple(ring[j][:2])
+            end = tuple(ring[j + 1][:2])
+            key = (style,min(start,end),max(start,end))
+            if key in edgeIndex:
+                neighbours[i].append(edgeIndex[key])
+                neighbours[edgeIndex[key]].append(i)
+            else:
+                edgeIndex[key] = i
+
+    # Now the grid for the layering check. The cell size is the median size of a region so most regions only cover a few cells, the few very large regions
+    # such as CTRs would cover far too many cells and are kept in a separate list that is always checked
+
+    boxes = [region["Box"] for region in regionData if not region["Box"] == None]
+    sizes = sorted(max(box[2] - box[0], box[3] - box[1]) for box in boxes)
+    cellSize = 1
+    if len(sizes) > 0 and sizes[len(sizes) // 2] > 0:
+        cellSize = sizes[len(sizes) // 2]
+    grid = {}
+    largeRegions = []
+    for i in range(len(regionData)):
+        box = regionData[i]["Box"]
+        if box == None:
+            continue
+        if (math.floor(box[2] / cellSize) - math.floor(box[0] / cellSize) + 1) * (math.floor(box[3] / cellSize) - math.floor(box[1] / cellSize) + 1) > 64:
+            largeRegions.append(i)
+            continue
+        for cell in gridCells(box,cellSize):
+            grid.setdefault(cell,[]).append(i)
+
+    # Then we grow the merged regions, always starting with the first polygon that hasn't been merged yet
+
+    mergedRegions = {}
+    mergedAway = set()
+    for first in candidates:
+        if first in mergedAway or first in mergedRegions:
+            continue
+        outline = {}
+        vertices = orientedRing(regionData[first]["Outline"])
+        if len(vertices) < 3 or not len(set(vertices)) == len(vertices):
+            continue
+        for k in range(len(vertices)):
+            outline[vertices[k]] = vertices[(k + 1) % len(vertices)]
+        priority = regionData[first]["Feature"].get("Priority")
+        members = [first]
+        memberSet = set(members)
+        queue = list(neighbours[first])
+        while len(queue) > 0:
+            i = queue.pop()
+            if i in mergedAway or i in mergedRegions or i in memberSet or i < first:
+                continue
+
+            # Check whether any region of the same priority read between the first polygon and this one overlaps this one
+
+            box = regionData[i]["Box"]
+            nearbyRegions = set(largeRegions)
+            for cell in gridCells(box,cellSize):
+                nearbyRegions.update(grid.get(cell,[]))
+            blocked = False
+            for j in nearbyRegions:
+                if j <= first or j >= i or j in memberSet or not regionData[j]["Feature"].get("Priority") == priority:
+                    continue
+                other = regionData[j]["Box"]
+                if box[0] <= other[2] and other[0] <= box[2] and box[1] <= other[3] and other[1] <= box[3]:
+                    blocked = True
+                    break
+            if blocked or not addRingToOutline(outline,orientedRing(regionData[i]["Outline"])):
+                continue
+            members.append(i)
+            memberSet.add(i)
+            queue.extend(neighbours[i])
+
+        if len(members) < 2:
+            continue
+
+        # Walk around the outline to turn it back into a closed GeoJSON ring
+
+        start = next(iter(outline))
+        ring = [list(start)]
+        vertex = outline[start]
+        while not vertex == start:
+            ring.append(list(vertex))
+            vertex = outline[vertex]
+        ring.append(list(start))
+
+        mergedFeature = dict(regionData[first]["Feature"])
+        mergedFeature["Coordinates"] = [[ring]]
+        mergedRegions[first] = mergedFeature
+        mergedAway.update(members[1:])
+        if debugging:
+            log += ("  Merged " + str(len(members)) + " regions of group " + mergedFeature["Group"] + " into one region with " + str(len(ring)) + " coordinates\n")
+
+    log += ("Region dissolve merged " + str(len(mergedAway) + len(mergedRegions)) + " regions into " + str(len(mergedRegions)) + ".\n")
+
+    # And lastly all regions are passed on to the formatter in the order they were read, with the merged regions taking the place of their first polygon
+
+    for i in range(len(regionData)):
+        if i in mergedAway:
+            continue
+        if i in mergedRegions:
+            addFeatureToOutput(mergedRegions[i],"MultiPolygon",regionData[i]["Path"],debugging)
+        else:
+            addFeatureToOutput(regionData[i]["Feature"],regionData[i]["Feature Type"],regionData[i]["Path"],debugging)
 
-sortRegions()
+    regionData = []
 
 # This is another helper function that converts color codes back from ES decimal format into a "human readable" hex code 
 
@@ -777,7 +1626,7 @@ def writeSctFile():
     global dateString
     global dateStringLong
 
-    sctFilePath = outputFolder + "QGIS_Generated_Sectorfile-" + dateStringLong + ".sct"
+    sctFilePath = outputFolder + outputPrefix + "QGIS_Generated_Sectorfile-" + dateStringLong + ".sct"
 
     geo = esData["geo"]["Output String"]
     regions = esData["regions"]["Output String"]
@@ -799,7 +1648,7 @@ def writeEseFile():
     global dateString
     global dateStringLong
 
-    eseFilePath = outputFolder + "QGIS_Generated_Sectorfile-" + dateStringLong + ".ese"
+    eseFilePath = outputFolder + outputPrefix + "QGIS_Generated_Sectorfile-" + dateStringLong + ".ese"
 
     freetext = esData["freetext"]["Output String"]
 
@@ -813,7 +1662,7 @@ def writeEseFile():
 
 def writeGngFile(filetype,string):
     global dateStringLong
-    gngRegionsFilePath = outputFolder + "GNG_" + filetype + "_Export-" + dateStringLong + ".txt"
+    gngRegionsFilePath = outputFolder + outputPrefix + "GNG_" + filetype + "_Export-" + dateStringLong + ".txt"
     with open (gngRegionsFilePath, 'w') as gngRegionsFile:
         gngRegionsFile.write(string)
 
@@ -840,38 +1689,262 @@ def formatForGng():
         labelgroup = layer["Labelgroup"]
         header = ":".join(["AERONAV",airport,labelgroup,"ES-ESE","QGIS " + AIRAC + "\n"])
         gngData["freetext"]["Output String"] += header + layer["Code"] + "\n\n"
-    for fileType in gngData:
-        writeGngFile(fileType,gngData[fileType]["Output String"])
-
-writeSctFile()
-writeEseFile()
-formatForGng()
 
 # And lastly, a bit of a dummy check, if there's any colours that were used in the sector filed that are not defined in GNG 
 # this will note that down in the log file, as this can lead to hard to trace errors in Euroscope's file reading.
 
-for color in colorsUsed:
-    if color == "":
-        continue
-    found = False
-    for entry in definitions["Colors"]["Sector File Colors"]:
-        if entry["Name"] == color:
-            found = True
-    if not found:
-        log += ("Color " + color + " either misspelled or not defined!")
+def checkColors():
+    global log
+    for color in colorsUsed:
+        if color == "":
+            continue
+        found = False
+        for entry in definitions["Colors"]["Sector File Colors"]:
+            if entry["Name"] == color:
+                found = True
+        if not found:
+            log += ("Color " + color + " either misspelled or not defined!")
 
 # Once all the major operations are completed we can write all the collected errors into a log file
 
-with open (outputFolder + "log_" + dateStringLong + ".txt","w") as logFile:
-    colorString = "\nFollowing color codes were used in the generation of this sectorfile:\n"
-    for color in colorsUsed:
-        if color == "":
+def writeLogFile():
+    global log
+    with open (outputFolder + outputPrefix + "log_" + dateStringLong + ".txt","w") as logFile:
+        colorString = "\nFollowing color codes were used in the generation of this sectorfile:\n"
+        for color in colorsUsed:
+            if color == "":
+                continue
+            try:
+                if int(color):
+                    color = hexColorCode(int(color))
+            except:
+                pass
+            colorString += "    " + str(color) + "\n"
+        log += colorString
+        logFile.write(log)
+
+# The output profile is written as a csv file so it can be sorted and filtered in any spreadsheet, by default every table is sorted by the column set in
+# the definitions with the largest entries first, so the groups where a simplification pays off the most are right at the top.
+
+def writeProfileFile():
+    settings = definitions.get("Output Profile",{})
+    if not settings.get("Enabled",False):
+        return
+    sortColumn = settings.get("Sort By","Vertices")
+    if not sortColumn in profileColumns:
+        sortColumn = "Vertices"
+    with open (outputFolder + outputPrefix + "Output_Profile-" + dateStringLong + ".csv","w") as profileFile:
+        profileFile.write(";".join(["Table","Name"] + profileColumns + ["Over Budget"]) + "\n")
+        for table in ["Group","Category","Airport"]:
+            entries = profileData.get(table,{})
+            for name in sorted(entries,key=lambda name: entries[name][sortColumn],reverse=True):
+                entry = entries[name]
+                values = [str(round(entry[column],3)) for column in profileColumns] + [", ".join(entry.get("Over Budget",[]))]
+                profileFile.write(";".join([table,name] + values) + "\n")
+
+# A build configuration bundles everything that may differ between two sectorfiles built from the same input, i.e. the definitions, the headers, the
+# AIRAC cycle and a prefix for the output file names. If there's no build configurations file we only build the one default configuration, otherwise
+# every entry in there is built. File names in the build configurations are relative to the configuration folder, anything that isn't defined is
+# taken from the default configuration.
+
+def readBuildConfigurations():
+    defaultConfiguration = {
+        "Name":"Default",
+        "Definitions":defFilePath,
+        "SCT Header":sctHeaderPath,
+        "ESE Header":eseHeaderPath,
+        "AIRAC":AIRAC,
+        "Output Prefix":"",
+        "Selection":exportSelection
+    }
+    if not path.isfile(buildFilePath):
+        return [defaultConfiguration]
+    with open (buildFilePath) as buildFile:
+        buildList = load(buildFile)
+    configurations = []
+    for entry in buildList:
+        configuration = dict(defaultConfiguration)
+        for key in entry:
+            if key in ["Definitions","SCT Header","ESE Header"]:
+                configuration[key] = configFolderPath + entry[key]
+            else:
+                configuration[key] = entry[key]
+        configurations.append(configuration)
+    return configurations
+
+# This builds one complete set of output files for a single build configuration from the features already parsed from the input folder. All the 
+# global output containers are reset first so that nothing leaks from one configuration into the next.
+
+def buildSectorfile(configuration,debugging = False):
+
+    global log
+    global AIRAC
+    global defFilePath
+    global sctHeaderPath
+    global eseHeaderPath
+    global outputPrefix
+    global selection
+
+    defFilePath = configuration["Definitions"]
+    sctHeaderPath = configuration["SCT Header"]
+    eseHeaderPath = configuration["ESE Header"]
+    AIRAC = configuration["AIRAC"]
+    outputPrefix = configuration["Output Prefix"]
+    selection = {"Airports":[],"Categories":[],"ES Categories":[]}
+    selection.update(configuration["Selection"])
+
+    log += "Building configuration " + configuration["Name"] + " for AIRAC " + AIRAC + "\n"
+    if debugging:
+        log += ("  Definitions File: " + defFilePath + "\n  .SCT  header File: " + sctHeaderPath + "\n  .ESE  header File: " + eseHeaderPath + "\n")
+
+    readDefinitions()
+    convertFeatures(debugging)
+    writeSctFile()
+    writeEseFile()
+    for fileType in gngData:
+        writeGngFile(fileType,gngData[fileType]["Output String"])
+    checkColors()
+    writeProfileFile()
+    writeLogFile()
+
+# This runs all the parsed features through the mapping, the optional stages and the formatters with the currently loaded definitions. The output only
+# ends up in the esData and gngData dicts, writing it anywhere is up to the caller.
+
+def convertFeatures(debugging = False):
+
+    global esData
+    global gngData
+    global colorsUsed
+    global labelData
+    global regionData
+    global profileData
+
+    esData = {category:{"Output String":"","Features":[]} for category in ["geo","freetext","regions"]}
+    gngData = {category:{"Output String":"","Features":{}} for category in ["geo","freetext","regions"]}
+    colorsUsed = []
+    labelData = []
+    regionData = []
+    profileData = {}
+
+    mapFeatures(debugging)
+
+    if definitions.get("Label Density",{}).get("Enabled",False):
+        checkLabelDensity(debugging)
+
+    if definitions.get("Region Dissolve",{}).get("Enabled",False):
+        dissolveRegions(debugging)
+
+    sortRegions()
+    formatForGng()
+    checkBudgets()
+
+# The exporter can also run as a local conversion service, so that the GUI or a QGIS plugin don't have to start the script for every single export. The
+# definitions are only read once when the service starts and stay loaded. Requests are JSON-RPC 2.0, one request (or a batch of requests as a list) per 
+# line, either on stdin/stdout or on a socket on localhost. The "convert" method takes a list of GeoJSON features and optionally the crs member and a 
+# selection, and returns the formatted sct, ese and GNG fragments together with the log. The "reload" method reads the definitions again.
+
+def convertServiceFeatures(params):
+
+    global log
+    global parsedFeatures
+    global selection
+
+    log = ""
+    parsedFeatures = []
+    parseFeatures(params["features"],readCRS({"crs":params.get("crs")}),"service request")
+    selection = {"Airports":[],"Categories":[],"ES Categories":[]}
+    selection.update(params.get("selection",{}))
+    convertFeatures()
+    return {
+        "sct":{"geo":esData["geo"]["Output String"],"regions":esData["regions"]["Output String"]},
+        "ese":{"freetext":esData["freetext"]["Output String"]},
+        "gng":{category:gngData[category]["Output String"] for category in gngData},
+        "log":log
+    }
+
+# This handles a single JSON-RPC request and returns the response, or None for notifications which don't get a response
+
+def handleServiceRequest(request):
+    if not isinstance(request,dict) or not request.get("jsonrpc") == "2.0" or not isinstance(request.get("method"),str):
+        return {"jsonrpc":"2.0","id":None,"error":{"code":-32600,"message":"Invalid request"}}
+    params = request.get("params",{})
+    try:
+        if request["method"] == "convert":
+            if not isinstance(params,dict) or not isinstance(params.get("features"),list):
+                response = {"error":{"code":-32602,"message":"Expected a list of GeoJSON features in params.features"}}
+            else:
+                response = {"result":convertServiceFeatures(params)}
+        elif request["method"] == "reload":
+            readDefinitions()
+            response = {"result":True}
+        else:
+            response = {"error":{"code":-32601,"message":"Unknown method " + request["method"]}}
+    except Exception as error:
+        response = {"error":{"code":-32603,"message":type(error).__name__ + ": " + str(error)}}
+    if not "id" in request:
+        return None
+    response["jsonrpc"] = "2.0"
+    response["id"] = request["id"]
+    return response
+
+# And this one handles a whole line, which can hold a single request or a batch of requests. It returns the line to send back or None if there's nothing to send.
+
+def handleServiceLine(line):
+    try:
+        request = loads(line)
+    except ValueError:
+        return dumps({"jsonrpc":"2.0","id":None,"error":{"code":-32700,"message":"Parse error"}})
+    if isinstance(request,list):
+        if len(request) == 0:
+            return dumps({"jsonrpc":"2.0","id":None,"error":{"code":-32600,"message":"Invalid request"}})
+        responses = [response for response in (handleServiceRequest(item) for item in request) if not response == None]
+        if len(responses) == 0:
+            return None
+        return dumps(responses)
+    response = handleServiceRequest(request)
+    if response == None:
+        return None
+    return dumps(response)
+
+# Runs the service on any pair of text streams until the input is closed
+
+def runService(inputStream,outputStream):
+    for line in inputStream:
+        if line.strip() == "":
             continue
-        try:
-            if int(color):
-                color = hexColorCode(int(color))
-        except:
-            pass
-        colorString += "    " + str(color) + "\n"
-    log += colorString
-    logFile.write(log)
\ No newline at end of file
+        response = handleServiceLine(line)
+        if not response == None:
+            outputStream.write(response + "\n")
+            outputStream.flush()
+
+# For the socket every connection is handled the same way as stdin/stdout, one connection after the other as the exporter keeps its state in globals
+
+class ServiceRequestHandler(StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line = line.decode("utf-8")
+            if line.strip() == "":
+                continue
+            response = handleServiceLine(line)
+            if not response == None:
+                self.wfile.write((response + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+# Now that everything is defined we can actually get to work. The input folder is only read once, the parsed features are then shared between all 
+# build configurations, each of which starts with the log collected while reading. If the script is started with --service or --service-port <port> it
+# runs as the conversion service instead.
+
+if "--service-port" in argv:
+    readDefinitions()
+    with TCPServer(("127.0.0.1",int(argv[argv.index("--service-port") + 1])),ServiceRequestHandler) as server:
+        server.serve_forever()
+elif "--service" in argv:
+    readDefinitions()
+    runService(stdin,stdout)
+else:
+    readFolder(geoJSONFolderPath,globalDebugging)
+
+    readLog = log
+    for buildConfiguration in readBuildConfigurations():
+        log = readLog
+        buildSectorfile(buildConfiguration,globalDebugging)